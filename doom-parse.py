@@ -1,256 +1,576 @@
+import mmap
 import struct
 import os
+import sys
 import json
+import numpy as np
 import omg  # pip install omgifol
-from dataclasses import dataclass
+import shapely  # pip install shapely
+from numba import njit  # pip install numba
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 
 # Input & output directories
 input_dir = "./wads"
+iwad_path = os.path.join(input_dir, "doom.wad")
 
-@dataclass
+@dataclass(slots=True)
 class Vertex:
     x: int
     y: int
 
-@dataclass
-class Linedef:
-    v0: int
-    v1: int
-    flags: int
-    special: int
-    tag: int
-    side0: int
-    side1: int
-
-@dataclass
-class Sidedef:
-    x_offset: int
-    y_offset: int
-    upper: str
-    lower: str
-    middle: str
-    sector: int
-
-@dataclass
-class Sector:
-    floor_height: int
-    ceiling_height: int
-    floor_texture: str
-    ceiling_texture: str
-    light_level: int
-    type: int
-    tag: int
-
-@dataclass
-class Thing:
-    x_pos: int
-    y_pos: int
-    angle: int
-    type: int
-    flags: int
-
-@dataclass
+@dataclass(slots=True)
 class Map:
+    """
+    A parsed map stored column-wise: each record field lives in its own
+    contiguous array (int32 for numbers, list of str for texture names).
+    """
     name: str
-    vertices: list[Vertex]
-    linedefs: list[Linedef]
-    sidedefs: list[Sidedef]
-    sectors: list[Sector]
-    things: list[Thing]
+    # VERTEXES
+    vx: np.ndarray
+    vy: np.ndarray
+    # LINEDEFS (side0/side1 are -1 when absent)
+    ld_v0: np.ndarray
+    ld_v1: np.ndarray
+    ld_flags: np.ndarray
+    ld_special: np.ndarray
+    ld_tag: np.ndarray
+    ld_side0: np.ndarray
+    ld_side1: np.ndarray
+    # SIDEDEFS
+    sd_x_offset: np.ndarray
+    sd_y_offset: np.ndarray
+    sd_upper: list[str]
+    sd_lower: list[str]
+    sd_middle: list[str]
+    sd_sector: np.ndarray
+    # SECTORS
+    sc_floor_height: np.ndarray
+    sc_ceiling_height: np.ndarray
+    sc_floor_texture: list[str]
+    sc_ceiling_texture: list[str]
+    sc_light_level: np.ndarray
+    sc_type: np.ndarray
+    sc_tag: np.ndarray
+    # THINGS
+    th_x: np.ndarray
+    th_y: np.ndarray
+    th_angle: np.ndarray
+    th_type: np.ndarray
+    th_flags: np.ndarray
     origin: Vertex
+    # Lazily built (S, 4) array of per-sector (xmin, ymin, xmax, ymax)
+    _sector_bboxes: np.ndarray = field(default=None, init=False, repr=False, compare=False)
+    # Lazily built STRtree over the sector bounding boxes
+    _sector_tree: shapely.STRtree = field(default=None, init=False, repr=False, compare=False)
+    # Sector index -> polygon (or None) from compute_sector_polygon
+    _polygon_cache: dict[int, np.ndarray] = field(default_factory=dict, init=False, repr=False, compare=False)
+    # Lazily built (offsets, edges) sector -> linedef index, see sector_edges
+    _sector_edges: tuple = field(default=None, init=False, repr=False, compare=False)
+    # Sector index -> polygon bounds (or None) from sector_polygon_bounds
+    _bounds_cache: dict[int, np.ndarray] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @property
+    def num_sectors(self):
+        return len(self.sc_tag)
+
+    def to_lumps(self):
+        """
+        Packs this map into an omg NameGroup. The geometry and thing lumps
+        are written straight from the columns, without omg records.
+        """
+        lumps = omg.MapEditor().to_lumps()
+        lumps["VERTEXES"] = omg.Lump(_pack(vertex_dt, self.vx, self.vy))
+        lumps["THINGS"] = omg.Lump(_pack(
+            thing_dt, self.th_x, self.th_y, self.th_angle, self.th_type, self.th_flags))
+        lumps["LINEDEFS"] = omg.Lump(_pack(
+            linedef_dt, self.ld_v0, self.ld_v1, self.ld_flags, self.ld_special,
+            self.ld_tag, self.ld_side0, self.ld_side1))
+        lumps["SIDEDEFS"] = omg.Lump(_pack(
+            sidedef_dt, self.sd_x_offset, self.sd_y_offset,
+            _texbytes(self.sd_upper), _texbytes(self.sd_lower), _texbytes(self.sd_middle),
+            self.sd_sector))
+        lumps["SECTORS"] = omg.Lump(_pack(
+            sector_dt, self.sc_floor_height, self.sc_ceiling_height,
+            _texbytes(self.sc_floor_texture), _texbytes(self.sc_ceiling_texture),
+            self.sc_light_level, self.sc_type, self.sc_tag))
+        return lumps
 
 # -------------------------------------------------------------------
 # Map data parsing
 
+# Structured record layouts for the binary map lumps
+vertex_dt = np.dtype([("x", "<i2"), ("y", "<i2")])
+linedef_dt = np.dtype([
+    ("v0", "<i2"), ("v1", "<i2"), ("flags", "<i2"), ("special", "<i2"),
+    ("tag", "<i2"), ("side0", "<u2"), ("side1", "<u2")
+])
+sidedef_dt = np.dtype([
+    ("x_offset", "<i2"), ("y_offset", "<i2"),
+    ("upper", "S8"), ("lower", "S8"), ("middle", "S8"), ("sector", "<i2")
+])
+sector_dt = np.dtype([
+    ("floor_height", "<i2"), ("ceiling_height", "<i2"),
+    ("floor_texture", "S8"), ("ceiling_texture", "S8"),
+    ("light_level", "<i2"), ("type", "<u2"), ("tag", "<u2")
+])
+thing_dt = np.dtype([
+    ("x_pos", "<i2"), ("y_pos", "<i2"), ("angle", "<u2"), ("type", "<i2"), ("flags", "<i2")
+])
+
+# Texture names repeat heavily across sidedefs and sectors, so each distinct
+# raw name is decoded once and the interned str is shared
+_texname_cache: dict[bytes, str] = {}
+
+def _texname(raw):
+    name = _texname_cache.get(raw)
+    if name is None:
+        name = sys.intern(raw.rstrip(b"\x00").decode("latin-1"))
+        _texname_cache[raw] = name
+    return name
+
+def _records(buf, dtype):
+    # Like the original per-record loops, ignore a trailing partial record
+    buf = memoryview(buf).cast("B")
+    return np.frombuffer(buf[:len(buf) - len(buf) % dtype.itemsize], dtype=dtype)
+
+def _column(arr, field):
+    return arr[field].astype(np.int32)
+
+def _texbytes(names):
+    # Same normalization omg applies when a texture name is assigned; the
+    # names stream straight into a preallocated "S8" array
+    return np.fromiter(
+        (omg.util.safe_name(name).encode("ascii") for name in names),
+        dtype="S8", count=len(names))
+
+def _pack(dtype, *columns):
+    """
+    Packs columns, in dtype field order, into the binary lump layout.
+    Out-of-range values wrap, so -1 sidedef indices become 0xFFFF.
+    """
+    arr = np.empty(len(columns[0]), dtype=dtype)
+    for name, column in zip(dtype.names, columns):
+        arr[name] = column
+    return arr.tobytes()
+
 def read_vertices(name_group):
     if "VERTEXES" not in name_group:
         raise KeyError("VERTEXES lump not found in the NameGroup.")
 
-    vertexes_lump = name_group["VERTEXES"].data
-    num_vertices = len(vertexes_lump) // 4
-    vertices = []
-
-    for i in range(num_vertices):
-        offset = i * 4
-        x, y = struct.unpack_from("<hh", vertexes_lump, offset)
-        vertices.append(Vertex(x, y))
-
-    return vertices
+    arr = _records(name_group["VERTEXES"], vertex_dt)
+    return {"vx": _column(arr, "x"), "vy": _column(arr, "y")}
 
 def read_linedefs(name_group):
     if "LINEDEFS" not in name_group:
         raise KeyError("LINEDEFS lump not found in the NameGroup.")
 
-    linedefs_lump = name_group["LINEDEFS"].data
-    num_linedefs = len(linedefs_lump) // 14
-    linedefs = []
-
-    for i in range(num_linedefs):
-        offset = i * 14
-        v0, v1, flags, special, tag, side0, side1 = struct.unpack_from("<hhhhhhh", linedefs_lump, offset)
-        side0 = side0 if side0 != 0xFFFF else -1
-        side1 = side1 if side1 != 0xFFFF else -1
-
-        linedefs.append(Linedef(v0, v1, flags, special, tag, side0, side1))
-
-    return linedefs
+    arr = _records(name_group["LINEDEFS"], linedef_dt)
+    side0 = np.where(arr["side0"] == 0xFFFF, -1, _column(arr, "side0"))
+    side1 = np.where(arr["side1"] == 0xFFFF, -1, _column(arr, "side1"))
+    return {
+        "ld_v0": _column(arr, "v0"),
+        "ld_v1": _column(arr, "v1"),
+        "ld_flags": _column(arr, "flags"),
+        "ld_special": _column(arr, "special"),
+        "ld_tag": _column(arr, "tag"),
+        "ld_side0": side0,
+        "ld_side1": side1,
+    }
 
 def read_sidedefs(name_group):
     if "SIDEDEFS" not in name_group:
         raise KeyError("SIDEDEFS lump not found in the NameGroup.")
 
-    sidedefs_lump = name_group["SIDEDEFS"].data
-    num_sidedefs = len(sidedefs_lump) // 30
-    sidedefs = []
-
-    for i in range(num_sidedefs):
-        offset = i * 30
-        x_offset, y_offset, upper, lower, middle, sector = struct.unpack_from("<hh8s8s8sh", sidedefs_lump, offset)
-
-        sidedefs.append(Sidedef(
-            x_offset,
-            y_offset,
-            upper.decode("latin-1").rstrip("\x00"),
-            lower.decode("latin-1").rstrip("\x00"),
-            middle.decode("latin-1").rstrip("\x00"),
-            sector
-        ))
-
-    return sidedefs
+    # "S8" fields come back with trailing NULs already stripped
+    arr = _records(name_group["SIDEDEFS"], sidedef_dt)
+    return {
+        "sd_x_offset": _column(arr, "x_offset"),
+        "sd_y_offset": _column(arr, "y_offset"),
+        "sd_upper": [_texname(b) for b in arr["upper"].tolist()],
+        "sd_lower": [_texname(b) for b in arr["lower"].tolist()],
+        "sd_middle": [_texname(b) for b in arr["middle"].tolist()],
+        "sd_sector": _column(arr, "sector"),
+    }
 
 def read_sectors(name_group):
     if "SECTORS" not in name_group:
         raise KeyError("SECTORS lump not found.")
 
-    sectors_lump = name_group["SECTORS"].data
-    num_sectors = len(sectors_lump) // 26
-    sectors = []
-
-    for i in range(num_sectors):
-        offset = i * 26
-        floor_height, ceiling_height, floor_texture, ceiling_texture, light_level, type, tag = struct.unpack_from("<hh8s8shHH", sectors_lump, offset)
-
-        sectors.append(Sector(
-            floor_height,
-            ceiling_height,
-            floor_texture.decode("latin-1").rstrip("\x00"),
-            ceiling_texture.decode("latin-1").rstrip("\x00"),
-            light_level,
-            type,
-            tag
-        ))
-
-    return sectors
+    arr = _records(name_group["SECTORS"], sector_dt)
+    return {
+        "sc_floor_height": _column(arr, "floor_height"),
+        "sc_ceiling_height": _column(arr, "ceiling_height"),
+        "sc_floor_texture": [_texname(b) for b in arr["floor_texture"].tolist()],
+        "sc_ceiling_texture": [_texname(b) for b in arr["ceiling_texture"].tolist()],
+        "sc_light_level": _column(arr, "light_level"),
+        "sc_type": _column(arr, "type"),
+        "sc_tag": _column(arr, "tag"),
+    }
 
 def read_things(name_group):
     if "THINGS" not in name_group:
         raise KeyError("THINGS lump not found.")
 
-    things_lump = name_group["THINGS"].data
-    num_things = len(things_lump) // 10
-    things = []
-
-    for i in range(num_things):
-        offset = i * 10
-        x_pos, y_pos, angle, type, flags = struct.unpack_from("<hhHhh", things_lump, offset)
-        things.append(Thing(x_pos, y_pos, angle, type, flags))
-
-    return things
+    arr = _records(name_group["THINGS"], thing_dt)
+    return {
+        "th_x": _column(arr, "x_pos"),
+        "th_y": _column(arr, "y_pos"),
+        "th_angle": _column(arr, "angle"),
+        "th_type": _column(arr, "type"),
+        "th_flags": _column(arr, "flags"),
+    }
 
 def read_origin(things):
-    origin = Vertex(0, 0)
-
-    for thing in things:
-        if thing.type == 1:
-            origin = Vertex(thing.x_pos, thing.y_pos)
-
-    return origin
+    """
+    Returns the position of the player 1 start (type 1). If several are
+    present the last one wins, as the engine would spawn there.
+    """
+    idx = np.flatnonzero(things["th_type"] == 1)
+    if not idx.size:
+        return Vertex(0, 0)
+    return Vertex(int(things["th_x"][idx[-1]]), int(things["th_y"][idx[-1]]))
+
+# WAD directory layout, and the lumps that may follow a map marker
+_WAD_HEADER = struct.Struct("<4sii")
+_WAD_ENTRY = struct.Struct("<ii8s")
+_MAP_LUMPS = {
+    "THINGS", "LINEDEFS", "SIDEDEFS", "VERTEXES", "SEGS", "SSECTORS",
+    "NODES", "SECTORS", "REJECT", "BLOCKMAP", "BEHAVIOR", "SCRIPTS",
+}
+_READ_LUMPS = {"THINGS", "LINEDEFS", "SIDEDEFS", "VERTEXES", "SECTORS"}
+
+def read_map_lumps(buf):
+    """
+    Walks the lump directory of a WAD image (e.g. an mmap) and returns
+    {map name: {lump name: memoryview}} holding zero-copy views of the
+    lumps the readers use. Maps are found the way omg finds them: a
+    marker followed by THINGS and LINEDEFS.
+    """
+    view = memoryview(buf)
+    magic, num_lumps, dir_offset = _WAD_HEADER.unpack_from(view)
+    if magic not in (b"IWAD", b"PWAD"):
+        raise ValueError("Not a WAD file.")
+
+    entries = [
+        (offset, size, name.split(b"\x00", 1)[0].decode("ascii", "ignore").upper())
+        for offset, size, name in _WAD_ENTRY.iter_unpack(
+            view[dir_offset:dir_offset + num_lumps * _WAD_ENTRY.size])
+    ]
+
+    maps = {}
+    i = 0
+    while i < num_lumps:
+        if (i < num_lumps - 2 and entries[i + 1][2] == "THINGS"
+                and entries[i + 2][2] == "LINEDEFS"):
+            lumps = maps[entries[i][2]] = {}
+            i += 1
+            while i < num_lumps and entries[i][2] in _MAP_LUMPS:
+                offset, size, name = entries[i]
+                if name in _READ_LUMPS:
+                    lumps[name] = view[offset:offset + size]
+                i += 1
+        else:
+            i += 1
+    return maps
 
 # -------------------------------------------------------------------
 # Sector lookup functions
 
+def _pack_points(xs, ys):
+    # Offset the signed 16-bit coordinates to non-negative, then x << 32 | y
+    return ((xs.astype(np.int64) + 32768) << 32) | (ys.astype(np.int64) + 32768)
+
+def _unpack_points(keys):
+    return (keys >> 32) - 32768, (keys & 0xFFFFFFFF) - 32768
+
+def _walk_segments(adjacency, used, point, edges=None):
+    """
+    Follows unused segments from point, marking them as used, and
+    returns the points reached in order. The segment indices taken are
+    appended to edges when it is given.
+    """
+    points = []
+    while True:
+        for i, other in adjacency[point]:
+            if not used[i]:
+                break
+        else:
+            return points
+        used[i] = 1
+        if edges is not None:
+            edges.append(i)
+        points.append(other)
+        point = other
+
+def _closed_sub_tour(adjacency, used, point):
+    """
+    Returns a walk of unused segments that leaves point and comes back to
+    it, or an empty list. Open spurs (dangling linedefs) are left unused.
+    """
+    blocked = []
+    try:
+        while True:
+            edges = []
+            tour = _walk_segments(adjacency, used, point, edges)
+            if not tour:
+                return []
+            for k in range(len(tour) - 1, -1, -1):
+                if tour[k] == point:
+                    for i in edges[k + 1:]:
+                        used[i] = 0
+                    return tour[:k + 1]
+            # Never came back: release the spur, but keep its first segment
+            # blocked while the other ways out of point are tried
+            for i in edges[1:]:
+                used[i] = 0
+            blocked.append(edges[0])
+    finally:
+        for i in blocked:
+            used[i] = 0
+
 def compute_sector_polygon(map_obj, sector_index):
     """
     Reconstructs a closed polygon for the given sector by gathering
     all edges (from linedefs whose sidedef references match the sector).
+    Returns a (2, N) float64 array of x and y coordinates, or None.
+    Results are cached on the map and returned read-only.
     """
-    segments = []
-    for ld in map_obj.linedefs:
-        # Check the front sidedef (side0)
-        if ld.side0 != -1 and map_obj.sidedefs[ld.side0].sector == sector_index:
-            v0 = map_obj.vertices[ld.v0]
-            v1 = map_obj.vertices[ld.v1]
-            segments.append(((v0.x, v0.y), (v1.x, v1.y)))
-        # Check the back sidedef (side1)
-        if ld.side1 != -1 and map_obj.sidedefs[ld.side1].sector == sector_index:
-            # Reverse the order so the edge is oriented consistently
-            v0 = map_obj.vertices[ld.v1]
-            v1 = map_obj.vertices[ld.v0]
-            segments.append(((v0.x, v0.y), (v1.x, v1.y)))
-
-    if not segments:
+    cache = map_obj._polygon_cache
+    if sector_index in cache:
+        return cache[sector_index]
+    polygon = _build_sector_polygon(map_obj, sector_index)
+    if polygon is not None:
+        polygon.flags.writeable = False
+    cache[sector_index] = polygon
+    return polygon
+
+def sector_edges(map_obj):
+    """
+    Returns a CSR-style (offsets, edges) index of the linedefs bounding
+    each sector, built in one pass over the linedefs. The edges of sector
+    s are edges[offsets[s]:offsets[s + 1]], each encoded as linedef * 2,
+    plus 1 when the sector is on the back side. Edges are kept in
+    linedef order, front before back.
+    """
+    if map_obj._sector_edges is None:
+        # Index -1 (no sidedef) lands on the appended sentinel
+        sd_sector_ext = np.append(map_obj.sd_sector, -1)
+        lines = np.arange(len(map_obj.ld_v0))
+        sectors = np.concatenate((sd_sector_ext[map_obj.ld_side0], sd_sector_ext[map_obj.ld_side1]))
+        edges = np.concatenate((lines * 2, lines * 2 + 1))
+        keep = sectors >= 0
+        sectors, edges = sectors[keep], edges[keep]
+        order = np.lexsort((edges, sectors))
+        counts = np.bincount(sectors, minlength=map_obj.num_sectors)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        map_obj._sector_edges = (offsets, edges[order])
+    return map_obj._sector_edges
+
+def _build_sector_polygon(map_obj, sector_index):
+    offsets, edges = sector_edges(map_obj)
+    if not 0 <= sector_index < len(offsets) - 1:
         return None
-
-    # Order segments into a continuous polygon.
-    # Start with the first segment.
-    polygon = list(segments.pop(0))
-    changed = True
-    while segments and changed:
-        changed = False
-        for seg in segments:
-            if seg[0] == polygon[-1]:
-                polygon.append(seg[1])
-                segments.remove(seg)
-                changed = True
-                break
-            elif seg[1] == polygon[-1]:
-                polygon.append(seg[0])
-                segments.remove(seg)
-                changed = True
-                break
-            elif seg[0] == polygon[0]:
-                polygon.insert(0, seg[1])
-                segments.remove(seg)
-                changed = True
-                break
-            elif seg[1] == polygon[0]:
-                polygon.insert(0, seg[0])
-                segments.remove(seg)
-                changed = True
-                break
+    edges = edges[offsets[sector_index]:offsets[sector_index + 1]]
+    lines, back = edges >> 1, (edges & 1).astype(bool)
+    # Front sidedefs (side0) keep the linedef direction, back sidedefs (side1)
+    # are reversed so the edge is oriented consistently
+    v0, v1 = map_obj.ld_v0[lines], map_obj.ld_v1[lines]
+    start = np.where(back, v1, v0)
+    end = np.where(back, v0, v1)
+    if not len(edges):
+        return None
+    # Endpoints are packed into single ints so the walk hashes and compares
+    # plain ints rather than (x, y) tuples
+    vx, vy = map_obj.vx, map_obj.vy
+    segments = list(zip(_pack_points(vx[start], vy[start]).tolist(),
+                        _pack_points(vx[end], vy[end]).tolist()))
+
+    # Order segments into a continuous polygon by walking an endpoint map,
+    # starting with the first segment and extending both ends.
+    adjacency = defaultdict(list)
+    for i, (a, b) in enumerate(segments):
+        adjacency[a].append((i, b))
+        adjacency[b].append((i, a))
+    used = bytearray(len(segments))
+    used[0] = 1
+    polygon = list(segments[0])
+    polygon.extend(_walk_segments(adjacency, used, polygon[-1]))
+    if polygon[0] != polygon[-1]:
+        polygon[:0] = reversed(_walk_segments(adjacency, used, polygon[0]))
+    # A vertex shared by several lobes of the sector (e.g. two areas touching
+    # at a corner) can close the walk early; splice the closed sub-tours
+    # still hanging off ring vertices in place, Hierholzer-style
+    stack = polygon[::-1]
+    polygon = []
+    while stack:
+        point = stack.pop()
+        polygon.append(point)
+        stack.extend(reversed(_closed_sub_tour(adjacency, used, point)))
     # Ensure the polygon is closed.
     if polygon[0] != polygon[-1]:
         polygon.append(polygon[0])
-    return [Vertex(x, y) for (x, y) in polygon]
+    polygon = np.array(polygon, dtype=np.int64)
+    return np.stack(_unpack_points(polygon)).astype(np.float64)
 
-def point_in_polygon(x, y, polygon):
-    """
-    Determines if the point (x, y) is inside the polygon.
-    Uses a ray-casting algorithm.
-    """
+@njit(boundscheck=False, fastmath=True)
+def _point_in_polygon(x, y, px, py):
     inside = False
-    n = len(polygon)
+    n = len(px)
     j = n - 1
     for i in range(n):
-        xi, yi = polygon[i].x, polygon[i].y
-        xj, yj = polygon[j].x, polygon[j].y
+        xi, yi = px[i], py[i]
+        xj, yj = px[j], py[j]
         if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi) + xi):
             inside = not inside
         j = i
     return inside
 
+@njit(boundscheck=False, fastmath=True)
+def _point_in_bounded_polygon(x, y, px, py, bounds):
+    if x < bounds[0] or y < bounds[1] or x > bounds[2] or y > bounds[3]:
+        return False
+    if bounds[4] <= x <= bounds[6] and bounds[5] <= y <= bounds[7]:
+        return True
+    return _point_in_polygon(x, y, px, py)
+
+def point_in_polygon(x, y, polygon, bounds=None):
+    """
+    Determines if the point (x, y) is inside the polygon.
+    Uses a ray-casting algorithm, compiled with numba. If bounds from
+    polygon_bounds are given, points outside the bounding box or inside
+    the interior square are answered without the ray cast.
+    """
+    if bounds is None:
+        return _point_in_polygon(float(x), float(y), polygon[0], polygon[1])
+    return _point_in_bounded_polygon(float(x), float(y), polygon[0], polygon[1], bounds)
+
+def polygon_bounds(polygon):
+    """
+    Returns the float64 array (xmin, ymin, xmax, ymax, in_xmin, in_ymin,
+    in_xmax, in_ymax): the polygon's bounding box, then an axis-aligned
+    square wholly inside it. The square is centred on the vertex centroid
+    and inscribed in the largest circle there that touches no edge; it is
+    empty when the centroid lies outside the polygon.
+    """
+    px, py = polygon
+    bounds = np.array([px.min(), py.min(), px.max(), py.max(), 0.0, 0.0, -1.0, -1.0])
+    cx, cy = px[:-1].mean(), py[:-1].mean()
+    if point_in_polygon(cx, cy, polygon):
+        # Distance from the centroid to the nearest edge
+        ax, ay = px[:-1], py[:-1]
+        dx, dy = px[1:] - ax, py[1:] - ay
+        length2 = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length2 > 0, ((cx - ax) * dx + (cy - ay) * dy) / length2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        r = np.hypot(ax + t * dx - cx, ay + t * dy - cy).min() / np.sqrt(2)
+        bounds[4:] = (cx - r, cy - r, cx + r, cy + r)
+    return bounds
+
+def sector_polygon_bounds(map_obj, sector_index):
+    """
+    Returns polygon_bounds for the sector's polygon, cached on the map,
+    or None when the sector has no polygon.
+    """
+    cache = map_obj._bounds_cache
+    if sector_index not in cache:
+        polygon = compute_sector_polygon(map_obj, sector_index)
+        cache[sector_index] = None if polygon is None else polygon_bounds(polygon)
+    return cache[sector_index]
+
+def points_in_polygon(xs, ys, polygon):
+    """
+    Vectorized point_in_polygon: returns a boolean array telling which
+    of the points (xs[i], ys[i]) are inside the closed polygon. All
+    edges are tested against all points in one (E, P) broadcast.
+    """
+    px, py = polygon
+    xi, yi = px[:-1, None], py[:-1, None]
+    xj, yj = px[1:, None], py[1:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crosses = ((yi > ys) != (yj > ys)) & (xs < (xj - xi) * (ys - yi) / (yj - yi) + xi)
+    return np.bitwise_xor.reduce(crosses, axis=0)
+
+def sector_bboxes(map_obj):
+    """
+    Returns an (S, 4) int32 array of (xmin, ymin, xmax, ymax) for each
+    sector, covering every linedef that has a sidedef in it. Sectors
+    without edges get an empty box that no point falls inside.
+    """
+    if map_obj._sector_bboxes is None:
+        info = np.iinfo(np.int32)
+        bboxes = np.empty((map_obj.num_sectors, 4), dtype=np.int32)
+        bboxes[:, :2] = info.max
+        bboxes[:, 2:] = info.min
+        sd_sector = map_obj.sd_sector
+        for side in (map_obj.ld_side0, map_obj.ld_side1):
+            lines = np.flatnonzero(side != -1)
+            sectors = sd_sector[side[lines]]
+            # Sidedefs pointing at no valid sector never match, as in the linear scan
+            keep = (sectors >= 0) & (sectors < map_obj.num_sectors)
+            lines, sectors = lines[keep], sectors[keep]
+            for v in (map_obj.ld_v0[lines], map_obj.ld_v1[lines]):
+                x, y = map_obj.vx[v], map_obj.vy[v]
+                np.minimum.at(bboxes[:, 0], sectors, x)
+                np.minimum.at(bboxes[:, 1], sectors, y)
+                np.maximum.at(bboxes[:, 2], sectors, x)
+                np.maximum.at(bboxes[:, 3], sectors, y)
+        map_obj._sector_bboxes = bboxes
+    return map_obj._sector_bboxes
+
+def sector_tree(map_obj):
+    """
+    Returns an STRtree indexing the sector bounding boxes; tree indices
+    are sector indices. Sectors without edges are left out of the index.
+    """
+    if map_obj._sector_tree is None:
+        bboxes = sector_bboxes(map_obj)
+        valid = bboxes[:, 0] <= bboxes[:, 2]
+        boxes = np.full(len(bboxes), None, dtype=object)
+        boxes[valid] = shapely.box(*bboxes[valid].T)
+        map_obj._sector_tree = shapely.STRtree(boxes)
+    return map_obj._sector_tree
+
 def find_sector_for_point(map_obj, x, y):
     """
-    Iterates over all sectors in the map and returns the sector
-    whose reconstructed polygon contains the point (x, y).
-    If no sector contains the point, returns None.
+    Returns the lowest-indexed sector whose reconstructed polygon contains
+    the point (x, y). Only sectors whose bounding box contains the point
+    are tested. If no sector contains the point, returns None.
     """
-    for sector_index, sector in enumerate(map_obj.sectors):
+    candidates = sector_tree(map_obj).query(shapely.Point(x, y))
+    for sector_index in np.sort(candidates).tolist():
         polygon = compute_sector_polygon(map_obj, sector_index)
-        if polygon and point_in_polygon(x, y, polygon):
+        if polygon is not None and point_in_polygon(
+                x, y, polygon, sector_polygon_bounds(map_obj, sector_index)):
             return sector_index
     return None
 
+def find_sectors_for_points(map_obj, xs, ys):
+    """
+    Batched find_sector_for_point: returns a list holding, for each
+    point (xs[i], ys[i]), the sector containing it or None.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    result = np.full(len(xs), -1)
+    point_idx, sector_idx = sector_tree(map_obj).query(shapely.points(xs, ys))
+    # Group candidate points by sector, visiting sectors in ascending order
+    # so each point keeps the first hit
+    order = np.argsort(sector_idx, kind="stable")
+    point_idx, sector_idx = point_idx[order], sector_idx[order]
+    sectors, starts = np.unique(sector_idx, return_index=True)
+    for sector_index, points in zip(sectors.tolist(), np.split(point_idx, starts[1:])):
+        points = points[result[points] == -1]
+        if not len(points):
+            continue
+        polygon = compute_sector_polygon(map_obj, sector_index)
+        if polygon is not None:
+            inside = points_in_polygon(xs[points], ys[points], polygon)
+            result[points[inside]] = sector_index
+    return [None if s == -1 else s for s in result.tolist()]
+
 # -------------------------------------------------------------------
 # DFS of sectors
 
@@ -260,11 +580,12 @@ def get_sector_neighbors(map_obj):
     Two sectors are considered adjacent if a linedef connects them (i.e., if the linedef
     has both a front and a back sidedef and they reference different sectors).
     """
-    adjacency = {i: set() for i in range(len(map_obj.sectors))}
-    for ld in map_obj.linedefs:
-        if ld.side0 != -1 and ld.side1 != -1:
-            sector_a = map_obj.sidedefs[ld.side0].sector
-            sector_b = map_obj.sidedefs[ld.side1].sector
+    adjacency = {i: set() for i in range(map_obj.num_sectors)}
+    sd_sector = map_obj.sd_sector.tolist()
+    for side0, side1 in zip(map_obj.ld_side0.tolist(), map_obj.ld_side1.tolist()):
+        if side0 != -1 and side1 != -1:
+            sector_a = sd_sector[side0]
+            sector_b = sd_sector[side1]
             if sector_a != sector_b:
                 adjacency[sector_a].add(sector_b)
                 adjacency[sector_b].add(sector_a)
@@ -301,32 +622,13 @@ def traverse_sectors(doom_map):
 
 def write_wad(wad, maps):
     for map_obj in maps:
-        map_data = omg.MapEditor()
-        map_data.vertexes = [omg.Vertex(x=v.x, y=v.y) for v in map_obj.vertices]
-        map_data.linedefs = [
-            omg.Linedef(vx_a=ld.v0, vx_b=ld.v1, flags=ld.flags, action=ld.special, 
-                        tag=ld.tag, front=ld.side0, back=ld.side1)
-            for ld in map_obj.linedefs
-        ]
-        map_data.sidedefs = [
-            omg.Sidedef(off_x=sd.x_offset, off_y=sd.y_offset, tx_up=sd.upper,
-                        tx_low=sd.lower, tx_mid=sd.middle, sector=sd.sector)
-            for sd in map_obj.sidedefs
-        ]
-        map_data.sectors = [
-            omg.Sector(z_floor=s.floor_height, z_ceil=s.ceiling_height,
-                       tx_floor=s.floor_texture, tx_ceil=s.ceiling_texture,
-                       light=s.light_level, type=s.type, tag=s.tag)
-            for s in map_obj.sectors
-        ]
-        map_data.things = [
-            omg.Thing(x=t.x_pos, y=t.y_pos, angle=t.angle, type=t.type, flags=t.flags)
-            for t in map_obj.things
-        ]
-        wad.maps[map_obj.name] = map_data.to_lumps()
-
-def copy_wad_resources(wad):
-    input_wad = omg.WAD("./wads/doom.wad")  # Load original WAD
+        wad.maps[map_obj.name] = map_obj.to_lumps()
+
+def copy_wad_resources(wad, input_wad):
+    """
+    Shares the non-map resources of input_wad (the already loaded
+    original WAD) with wad by reference.
+    """
     wad.sprites = input_wad.sprites
     wad.patches = input_wad.patches
     wad.flats = input_wad.flats
@@ -340,30 +642,84 @@ def copy_wad_resources(wad):
     wad.graphics = input_wad.graphics
     wad.data = input_wad.data
 
-maps = []
-for filename in os.listdir(input_dir):
-    if filename.lower().endswith(".wad"):
-        wad_path = os.path.join(input_dir, filename)
-        wad = omg.WAD(wad_path)
-        for lump in wad.maps:
-            map_data = wad.maps[lump]
-            things = read_things(map_data)
-            origin = read_origin(things)
-            maps.append(Map(
-                name=lump,
-                vertices=read_vertices(map_data),
-                linedefs=read_linedefs(map_data),
-                sidedefs=read_sidedefs(map_data),
-                sectors=read_sectors(map_data),
-                things=things,
-                origin=origin
-            ))
-
-print(len(maps))
-
-traverse_sectors(maps[0])
-
-wad = omg.WAD()
-write_wad(wad, maps[:2])
-copy_wad_resources(wad);
-wad.to_file("./output.wad")
+def parse_maps(map_groups):
+    """
+    Parses (map name, {lump name: buffer}) pairs into Maps.
+    """
+    maps = []
+    for lump, map_data in map_groups:
+        things = read_things(map_data)
+        origin = read_origin(things)
+        maps.append(Map(
+            name=lump,
+            **read_vertices(map_data),
+            **read_linedefs(map_data),
+            **read_sidedefs(map_data),
+            **read_sectors(map_data),
+            **things,
+            origin=origin
+        ))
+    return maps
+
+def parse_wad(wad):
+    """
+    Parses every map in a loaded omg.WAD.
+    """
+    return parse_maps(
+        (lump, {name: wad.maps[lump][name].data for name in wad.maps[lump]})
+        for lump in wad.maps
+    )
+
+def parse_one(wad_path):
+    """
+    Memory-maps a WAD and parses every map in it. Runs in a worker process.
+    """
+    with open(wad_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        maps = parse_maps(read_map_lumps(mm).items())
+    except BaseException:
+        try:
+            mm.close()
+        except BufferError:
+            # Views into the mapping are still held by the frames of the
+            # propagating exception; let it through and leave the mapping
+            # to be released when they are collected
+            pass
+        raise
+    # On success no views may outlive the parse, so a BufferError here is a leak
+    mm.close()
+    return maps
+
+if __name__ == "__main__":
+    wad_paths = [
+        os.path.join(input_dir, filename)
+        for filename in os.listdir(input_dir)
+        if filename.lower().endswith(".wad")
+    ]
+
+    # The original WAD is loaded once here: its maps are parsed in-process
+    # and its resources are reused by copy_wad_resources
+    wad_cache = {iwad_path: omg.WAD(iwad_path)}
+
+    maps = []
+    with ProcessPoolExecutor() as executor:
+        pending = {
+            wad_path: executor.submit(parse_one, wad_path)
+            for wad_path in wad_paths
+            if wad_path not in wad_cache
+        }
+        for wad_path in wad_paths:
+            if wad_path in wad_cache:
+                maps.extend(parse_wad(wad_cache[wad_path]))
+            else:
+                maps.extend(pending[wad_path].result())
+
+    print(len(maps))
+
+    traverse_sectors(maps[0])
+
+    wad = omg.WAD()
+    write_wad(wad, maps[:2])
+    copy_wad_resources(wad, wad_cache[iwad_path]);
+    wad.to_file("./output.wad")
@@ -0,0 +1,119 @@
+import importlib.util
+import os
+
+import numpy as np
+import omg
+import pytest
+
+# doom-parse.py is a script with a hyphenated name, so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "doom_parse", os.path.join(os.path.dirname(__file__), "doom-parse.py"))
+doom_parse = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(doom_parse)
+
+def make_map(vertices, linedefs, sectors, num_sectors=None):
+    """
+    Builds a one-sided Map from (x, y) vertices, (v0, v1) linedefs and the
+    sector each linedef faces. num_sectors defaults to one past the highest
+    sector referenced.
+    """
+    def col(values):
+        return np.array(values, dtype=np.int32)
+
+    n = len(linedefs)
+    if num_sectors is None:
+        num_sectors = max(sectors) + 1
+    return doom_parse.Map(
+        name="MAP01",
+        vx=col([x for x, _ in vertices]), vy=col([y for _, y in vertices]),
+        ld_v0=col([a for a, _ in linedefs]), ld_v1=col([b for _, b in linedefs]),
+        ld_flags=col([1] * n), ld_special=col([0] * n), ld_tag=col([0] * n),
+        ld_side0=col(range(n)), ld_side1=col([-1] * n),
+        sd_x_offset=col([0] * n), sd_y_offset=col([0] * n),
+        sd_upper=["-"] * n, sd_lower=["-"] * n, sd_middle=["STARTAN3"] * n,
+        sd_sector=col(sectors),
+        sc_floor_height=col([0] * num_sectors), sc_ceiling_height=col([128] * num_sectors),
+        sc_floor_texture=["FLOOR4_8"] * num_sectors, sc_ceiling_texture=["CEIL3_5"] * num_sectors,
+        sc_light_level=col([160] * num_sectors), sc_type=col([0] * num_sectors),
+        sc_tag=col([0] * num_sectors),
+        th_x=col([]), th_y=col([]), th_angle=col([]), th_type=col([]), th_flags=col([]),
+        origin=doom_parse.Vertex(0, 0),
+    )
+
+def test_figure_eight_sector_keeps_both_lobes():
+    # Two squares of one sector touching at the corner (256, 256)
+    vertices = [(0, 0), (0, 256), (256, 256), (256, 0), (256, 512), (512, 512), (512, 256)]
+    linedefs = [(0, 1), (1, 2), (2, 3), (3, 0), (2, 4), (4, 5), (5, 6), (6, 2)]
+    map_obj = make_map(vertices, linedefs, [0] * len(linedefs))
+
+    polygon = doom_parse.compute_sector_polygon(map_obj, 0)
+    assert polygon.shape == (2, 9)
+    assert doom_parse.find_sector_for_point(map_obj, 100, 100) == 0
+    assert doom_parse.find_sector_for_point(map_obj, 400, 400) == 0
+    assert doom_parse.find_sector_for_point(map_obj, 400, 100) is None
+    assert doom_parse.find_sectors_for_points(map_obj, [100, 400, 400], [100, 400, 100]) == [0, 0, None]
+
+def write_test_wad(path, drop=(), pad=()):
+    """
+    Writes a one-sector WAD to path, optionally without the lumps in drop
+    or with a stray trailing byte on the lumps in pad.
+    """
+    editor = omg.MapEditor()
+    editor.draw_sector([(0, 0), (0, 256), (256, 256), (256, 0)])
+    editor.things.append(omg.Thing(x=128, y=128, type=1))
+    lumps = editor.to_lumps()
+    for name in drop:
+        del lumps[name]
+    for name in pad:
+        lumps[name] = omg.Lump(lumps[name].data + b"\x00")
+    wad = omg.WAD()
+    wad.maps["MAP01"] = lumps
+    wad.to_file(str(path))
+    return str(path)
+
+def test_parse_one_propagates_parse_errors(tmp_path):
+    path = write_test_wad(tmp_path / "broken.wad", drop=("SIDEDEFS",))
+    with pytest.raises(KeyError, match="SIDEDEFS"):
+        doom_parse.parse_one(path)
+
+def test_readers_ignore_trailing_partial_records(tmp_path):
+    clean = doom_parse.parse_one(write_test_wad(tmp_path / "clean.wad"))[0]
+    padded = doom_parse.parse_one(write_test_wad(
+        tmp_path / "padded.wad", pad=("VERTEXES", "LINEDEFS", "SIDEDEFS", "SECTORS", "THINGS")))[0]
+    for name in ("VERTEXES", "LINEDEFS", "SIDEDEFS", "SECTORS", "THINGS"):
+        assert padded.to_lumps()[name].data == clean.to_lumps()[name].data
+
+def test_dangling_linedef_does_not_cut_the_sector():
+    # A closed square with an open spur from its top-right corner inwards
+    vertices = [(0, 0), (0, 128), (0, 256), (256, 256), (256, 128), (256, 0), (128, 200)]
+    linedefs = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0), (3, 6)]
+    map_obj = make_map(vertices, linedefs, [0] * len(linedefs))
+
+    assert doom_parse.find_sector_for_point(map_obj, 200, 220) == 0
+    assert doom_parse.find_sector_for_point(map_obj, 50, 50) == 0
+    assert doom_parse.find_sectors_for_points(map_obj, [200, 50], [220, 50]) == [0, 0]
+
+def test_out_of_range_sidedef_sectors_are_ignored():
+    # Two squares of sector 0; one square's sidedefs point past the last
+    # sector, the other's at a negative index
+    vertices = [(0, 0), (0, 256), (256, 256), (256, 0), (512, 0), (512, 256), (768, 256), (768, 0)]
+    linedefs = [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4), (0, 2)]
+    map_obj = make_map(vertices, linedefs, [0, 0, 0, 0, 5, 5, 5, 5, -2], num_sectors=1)
+
+    assert doom_parse.find_sector_for_point(map_obj, 100, 200) == 0
+    assert doom_parse.find_sector_for_point(map_obj, 600, 100) is None
+    assert doom_parse.sector_bboxes(map_obj).tolist() == [[0, 0, 256, 256]]
+
+def test_parse_one_reports_views_leaked_past_a_successful_parse(tmp_path, monkeypatch):
+    path = write_test_wad(tmp_path / "clean.wad")
+    parse_maps = doom_parse.parse_maps
+    leaked = []
+
+    def leaky_parse_maps(items):
+        items = list(items)
+        leaked.extend(np.frombuffer(lumps["VERTEXES"], dtype=np.uint8) for _, lumps in items)
+        return parse_maps(items)
+
+    monkeypatch.setattr(doom_parse, "parse_maps", leaky_parse_maps)
+    with pytest.raises(BufferError):
+        doom_parse.parse_one(path)